@@ -3,67 +3,73 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from io import BytesIO
+from dashboard_common import (STATIC_PLOT, build_cube, bubble_points, convert_df_to_excel,
+                              convert_df_to_parquet, filter_options, filter_rows, load_data, nunique_codes,
+                              platform_sums, refill, revenue_trend, selection_key, top_by_revenue)
 
 # -------------------- Page Setup --------------------
 st.set_page_config(page_title="Centralized Dashboard", layout="wide")
 st.title("Centralized Dashboard")
 st.markdown("Analyze fashion sales performance across platforms, products, and cities.")
 
-# -------------------- Load Dataset --------------------
-@st.cache_data
-def load_data(file):
-    df = pd.read_excel(file)
-    df['Date'] = pd.to_datetime(df['Date'])
-    # Ensure numeric columns
-    df['Revenue'] = pd.to_numeric(df['Revenue'], errors='coerce')
-    df['Profit'] = pd.to_numeric(df['Profit'], errors='coerce')
-    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-    return df
+@st.cache_resource
+def chart_templates():
+    fig_rev_platform = px.bar(pd.DataFrame(columns=['Platform', 'Revenue']), x='Platform', y='Revenue', text='Revenue', title='Revenue by Platform')
+    fig_rev_platform.update_traces(texttemplate='$%{text:,.2f}', textposition='outside')
+    fig_rev_platform.update_layout(showlegend=False)
 
-data = load_data("fashion_dataset.xlsx")
+    fig_profit_platform = px.bar(pd.DataFrame(columns=['Platform', 'Profit']), x='Platform', y='Profit', text='Profit', title='Profit by Platform')
+    fig_profit_platform.update_traces(texttemplate='$%{text:,.2f}', textposition='outside')
+    fig_profit_platform.update_layout(showlegend=False)
 
-# -------------------- Sidebar Filters --------------------
-st.sidebar.markdown("### Filters")
+    fig_top_products = px.bar(pd.DataFrame(columns=['Revenue', 'Product']), x='Revenue', y='Product', orientation='h',
+                              title='Top 5 Products by Revenue', text='Revenue',
+                              color_discrete_sequence=['#FFFACD'])
+    fig_top_products.update_traces(texttemplate='$%{text:,.2f}', textposition='inside')
 
-# Date range
-min_date = data['Date'].min()
-max_date = data['Date'].max()
-date_range = st.sidebar.date_input("Select Date Range", [min_date, max_date])
+    fig_top_cities = px.bar(pd.DataFrame(columns=['Revenue', 'City']), x='Revenue', y='City', orientation='h',
+                            title='Top 5 Cities by Revenue', text='Revenue',
+                            color_discrete_sequence=['#90EE90'])
+    fig_top_cities.update_traces(texttemplate='$%{text:,.2f}', textposition='inside')
 
-# Platform filter
-platforms = ["All"] + sorted(data['Platform'].unique().tolist())
-selected_platform = st.sidebar.multiselect("Platform", platforms, default="All")
+    fig_rev_trend = px.line(pd.DataFrame(columns=['Date', 'Revenue']), x='Date', y='Revenue', title='Revenue Trend Over Time')
+    fig_rev_trend.update_traces(mode='lines+markers')
+    return {'rev_platform': fig_rev_platform, 'profit_platform': fig_profit_platform, 'top_products': fig_top_products, 'top_cities': fig_top_cities, 'rev_trend': fig_rev_trend}
 
-# State filter
-states = ["All"] + sorted(data['State'].unique().tolist())
-selected_state = st.sidebar.multiselect("State", states, default="All")
+# -------------------- Load Dataset --------------------
+data = load_data("fashion_dataset.xlsx")
+cube = build_cube("fashion_dataset.xlsx", data)
+options = filter_options("fashion_dataset.xlsx", data)
 
-# City filter
-cities = ["All"] + sorted(data['City'].unique().tolist())
-selected_city = st.sidebar.multiselect("City", cities, default="All")
+# -------------------- Sidebar Filters --------------------
+st.sidebar.markdown("### Filters")
+with st.sidebar.form("filters"):
 
-# Product filter
-products = ["All"] + sorted(data['Product'].unique().tolist())
-selected_product = st.sidebar.multiselect("Product", products, default="All")
+    # Date range
+    min_date = data['Date'].min()
+    max_date = data['Date'].max()
+    date_range = st.date_input("Select Date Range", [min_date, max_date])
 
-# -------------------- Filter Data --------------------
-filtered_data = data.copy()
+    # Platform filter
+    selected_platform = st.multiselect("Platform", options['Platform'], default="All")
 
-filtered_data = filtered_data[(filtered_data['Date'] >= pd.to_datetime(date_range[0])) &
-                              (filtered_data['Date'] <= pd.to_datetime(date_range[1]))]
+    # State filter
+    selected_state = st.multiselect("State", options['State'], default="All")
 
-if "All" not in selected_platform:
-    filtered_data = filtered_data[filtered_data['Platform'].isin(selected_platform)]
+    # City filter
+    selected_city = st.multiselect("City", options['City'], default="All")
 
-if "All" not in selected_state:
-    filtered_data = filtered_data[filtered_data['State'].isin(selected_state)]
+    # Product filter
+    selected_product = st.multiselect("Product", options['Product'], default="All")
 
-if "All" not in selected_city:
-    filtered_data = filtered_data[filtered_data['City'].isin(selected_city)]
+    st.form_submit_button("Apply")
 
-if "All" not in selected_product:
-    filtered_data = filtered_data[filtered_data['Product'].isin(selected_product)]
+# -------------------- Filter Data --------------------
+selections = {'Platform': selected_platform, 'State': selected_state,
+              'City': selected_city, 'Product': selected_product}
+lo, hi, mask = filter_rows(data, cube, date_range[0], date_range[1], selections)
+filtered_data = data.iloc[lo:hi].iloc[mask]
+filter_key = selection_key(date_range[0], date_range[1], selections)
 
 # -------------------- Check for empty data --------------------
 if filtered_data.empty:
@@ -72,17 +78,17 @@ else:
 
     # -------------------- KPIs --------------------
     total_revenue = filtered_data['Revenue'].sum()
-    total_orders = filtered_data['Order_ID'].nunique()
+    total_orders = nunique_codes(filtered_data['Order_ID'])
     aov = total_revenue / total_orders if total_orders else 0
     total_profit = filtered_data['Profit'].sum()
     
     # Fixed Return/Cancel Orders KPI
-    return_cancel_orders = filtered_data[
-        filtered_data['Delivery_Status'].isin(['Return', 'Cancel'])
-    ]['Order_ID'].nunique()  # counts unique orders only
+    return_cancel_orders = nunique_codes(filtered_data.loc[
+        filtered_data['Delivery_Status'].isin(['Return', 'Cancel']), 'Order_ID'
+    ])  # counts unique orders only
     
     total_quantity = filtered_data['Quantity'].sum()
-    unique_customers = filtered_data['Customer_ID'].nunique()
+    unique_customers = nunique_codes(filtered_data['Customer_ID'])
 
     kpi1, kpi2, kpi3 = st.columns(3)
     kpi4, kpi5, kpi6 = st.columns(3)
@@ -95,71 +101,62 @@ else:
     kpi5.metric("Unique Customers", unique_customers)
 
     # -------------------- Charts --------------------
-    # Revenue by Platform
-    rev_platform = filtered_data.groupby("Platform")['Revenue'].sum().reset_index()
-    fig_rev_platform = px.bar(rev_platform, x='Platform', y='Revenue', text='Revenue', title='Revenue by Platform')
-    fig_rev_platform.update_traces(texttemplate='$%{text:,.2f}', textposition='outside')
-    fig_rev_platform.update_layout(showlegend=False)
+    @st.cache_resource(max_entries=32)
+    def build_figures(filter_key, _df):
+        templates = chart_templates()
+        by_sku, by_platform = platform_sums(_df)
 
-    # Profit by Platform
-    profit_platform = filtered_data.groupby("Platform")['Profit'].sum().reset_index()
-    fig_profit_platform = px.bar(profit_platform, x='Platform', y='Profit', text='Profit', title='Profit by Platform')
-    fig_profit_platform.update_traces(texttemplate='$%{text:,.2f}', textposition='outside')
-    fig_profit_platform.update_layout(showlegend=False)
+        # Revenue by Platform
+        fig_rev_platform = refill(templates['rev_platform'], x=by_platform['Platform'].to_numpy(), y=by_platform['Revenue'].to_numpy(), text=by_platform['Revenue'].to_numpy())
 
-    # Top 5 Products by Revenue (light yellow)
-    top_products = filtered_data.groupby('Product')['Revenue'].sum().sort_values(ascending=False).head(5).reset_index()
-    fig_top_products = px.bar(top_products, x='Revenue', y='Product', orientation='h',
-                              title='Top 5 Products by Revenue', text='Revenue',
-                              color_discrete_sequence=['#FFFACD'])
-    fig_top_products.update_traces(texttemplate='$%{text:,.2f}', textposition='inside')
+        # Profit by Platform
+        fig_profit_platform = refill(templates['profit_platform'], x=by_platform['Platform'].to_numpy(), y=by_platform['Profit'].to_numpy(), text=by_platform['Profit'].to_numpy())
 
-    # Top 5 Cities by Revenue (light green)
-    top_cities = filtered_data.groupby('City')['Revenue'].sum().sort_values(ascending=False).head(5).reset_index()
-    fig_top_cities = px.bar(top_cities, x='Revenue', y='City', orientation='h',
-                            title='Top 5 Cities by Revenue', text='Revenue',
-                            color_discrete_sequence=['#90EE90'])
-    fig_top_cities.update_traces(texttemplate='$%{text:,.2f}', textposition='inside')
+        # Top 5 Products by Revenue (light yellow)
+        top_products = top_by_revenue(_df, 'Product', 5)
+        fig_top_products = refill(templates['top_products'], x=top_products['Revenue'].to_numpy(), y=top_products['Product'].to_numpy(), text=top_products['Revenue'].to_numpy())
 
-    # Revenue Trend Over Time
-    rev_trend = filtered_data.groupby('Date')['Revenue'].sum().reset_index()
-    fig_rev_trend = px.line(rev_trend, x='Date', y='Revenue', title='Revenue Trend Over Time')
-    fig_rev_trend.update_traces(mode='lines+markers')
+        # Top 5 Cities by Revenue (light green)
+        top_cities = top_by_revenue(_df, 'City', 5)
+        fig_top_cities = refill(templates['top_cities'], x=top_cities['Revenue'].to_numpy(), y=top_cities['City'].to_numpy(), text=top_cities['Revenue'].to_numpy())
 
-    # Revenue vs Quantity Bubble Chart
-    bubble_data = filtered_data.groupby(['Platform', 'SKU']).agg({'Revenue':'sum', 'Quantity':'sum'}).reset_index()
-    fig_bubble = px.scatter(bubble_data, x='Quantity', y='Revenue', size='Revenue', color='Platform',
-                            hover_name='SKU', title='Revenue vs Quantity by Platform', size_max=60)
+        # Revenue Trend Over Time
+        rev_trend = revenue_trend(_df)
+        fig_rev_trend = refill(templates['rev_trend'], x=rev_trend['Date'].to_numpy(), y=rev_trend['Revenue'].to_numpy())
 
-    # -------------------- Layout: 3 rows x 2 columns --------------------
-    col1, col2 = st.columns(2)
-    col1.plotly_chart(fig_rev_platform, use_container_width=True)
-    col2.plotly_chart(fig_profit_platform, use_container_width=True)
+        # Revenue vs Quantity Bubble Chart
+        bubble_data = bubble_points(by_sku)
+        fig_bubble = px.scatter(bubble_data, x='Quantity', y='Revenue', size='Revenue', color='Platform',
+                                hover_name='SKU', title='Revenue vs Quantity by Platform', size_max=60,
+                                render_mode='webgl')
+        return fig_rev_platform, fig_profit_platform, fig_top_products, fig_top_cities, fig_rev_trend, fig_bubble
 
-    col3, col4 = st.columns(2)
-    col3.plotly_chart(fig_top_products, use_container_width=True)
-    col4.plotly_chart(fig_top_cities, use_container_width=True)
+    fig_rev_platform, fig_profit_platform, fig_top_products, fig_top_cities, fig_rev_trend, fig_bubble = build_figures(filter_key, filtered_data)
 
-    col5, col6 = st.columns(2)
-    col5.plotly_chart(fig_rev_trend, use_container_width=True)
-    col6.plotly_chart(fig_bubble, use_container_width=True)
+    # -------------------- Layout: 3 rows x 2 columns --------------------
+    chart_rows = [(fig_rev_platform, fig_profit_platform, STATIC_PLOT),
+                  (fig_top_products, fig_top_cities, STATIC_PLOT),
+                  (fig_rev_trend, fig_bubble, None)]
+    for left, right, config in chart_rows:
+        col_left, col_right = st.columns(2)
+        col_left.plotly_chart(left, use_container_width=True, config=config)
+        col_right.plotly_chart(right, use_container_width=True, config=config)
 
     # -------------------- Filtered Data Table --------------------
     st.markdown("### Filtered Data Preview")
     st.dataframe(filtered_data.head(30))
 
     # -------------------- Download Button --------------------
-    def convert_df_to_excel(df):
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
-        return output.getvalue()
-
-    excel_data = convert_df_to_excel(filtered_data)
-
+    # Parquet is the default download; each file is only built when its button is clicked
     st.download_button(
         label="Download Filtered Data",
-        data=excel_data,
+        data=lambda: convert_df_to_parquet(filtered_data),
+        file_name="filtered_fashion_data.parquet",
+        mime="application/vnd.apache.parquet"
+    )
+    st.download_button(
+        label="Download Filtered Data (Excel)",
+        data=lambda: convert_df_to_excel(filtered_data),
         file_name="filtered_fashion_data.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
@@ -3,70 +3,67 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from io import BytesIO
+from dashboard_common import (STATIC_PLOT, build_cube, build_top_figures, bubble_points, convert_df_to_excel,
+                              convert_df_to_parquet, filter_options, filter_rows, load_data, nunique_codes,
+                              platform_sums, refill, revenue_trend, selection_key)
 
 # -------------------- Page Setup --------------------
 st.set_page_config(page_title="Centralized Dashboard", layout="wide")
 st.title("Centralized Dashboard")
 st.markdown("Analyze fashion sales performance across platforms, products, and cities.")
 
-# -------------------- Load Dataset --------------------
-@st.cache_data
-def load_data(file):
-    df = pd.read_excel(file)
-    df['Date'] = pd.to_datetime(df['Date'])
-    df['Revenue'] = pd.to_numeric(df['Revenue'], errors='coerce')
-    df['Profit'] = pd.to_numeric(df['Profit'], errors='coerce')
-    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-    return df
+@st.cache_resource
+def chart_templates():
+    fig_rev_platform = px.bar(pd.DataFrame(columns=['Platform', 'Revenue']), x='Platform', y='Revenue', text='Revenue', title='Revenue by Platform')
+    fig_rev_platform.update_traces(texttemplate='₹%{text:,.2f}', textposition='outside')
+    fig_rev_platform.update_layout(showlegend=False)
 
-data = load_data("fashion_dataset.xlsx")
+    fig_profit_platform = px.bar(pd.DataFrame(columns=['Platform', 'Profit']), x='Platform', y='Profit', text='Profit', title='Profit by Platform', color_discrete_sequence=['#FFD580'])
+    fig_profit_platform.update_traces(texttemplate='₹%{text:,.2f}', textposition='outside')
+    fig_profit_platform.update_layout(showlegend=False)
 
-# -------------------- Sidebar Filters --------------------
-st.sidebar.markdown("### Filters")
 
-# Date range
-min_date = data['Date'].min()
-max_date = data['Date'].max()
-date_range = st.sidebar.date_input("Select Date Range", [min_date, max_date])
+    fig_rev_trend = px.line(pd.DataFrame(columns=['Date', 'Revenue']), x='Date', y='Revenue', title='Revenue Trend Over Time')
+    fig_rev_trend.update_traces(mode='lines+markers', hovertemplate='Date: %{x}<br>Revenue: ₹%{y:,.2f}')
+    return {'rev_platform': fig_rev_platform, 'profit_platform': fig_profit_platform, 'rev_trend': fig_rev_trend}
 
-# Platform filter
-platforms = ["All"] + sorted(data['Platform'].unique().tolist())
-selected_platform = st.sidebar.multiselect("Platform", platforms, default="All")
+# -------------------- Load Dataset --------------------
+data = load_data("fashion_dataset.xlsx")
+cube = build_cube("fashion_dataset.xlsx", data)
+options = filter_options("fashion_dataset.xlsx", data)
 
-# State filter
-states = ["All"] + sorted(data['State'].unique().tolist())
-selected_state = st.sidebar.multiselect("State", states, default="All")
+# -------------------- Sidebar Filters --------------------
+st.sidebar.markdown("### Filters")
+with st.sidebar.form("filters"):
 
-# City filter
-cities = ["All"] + sorted(data['City'].unique().tolist())
-selected_city = st.sidebar.multiselect("City", cities, default="All")
+    # Date range
+    min_date = data['Date'].min()
+    max_date = data['Date'].max()
+    date_range = st.date_input("Select Date Range", [min_date, max_date])
 
-# Product filter
-products = ["All"] + sorted(data['Product'].unique().tolist())
-selected_product = st.sidebar.multiselect("Product", products, default="All")
+    # Platform filter
+    selected_platform = st.multiselect("Platform", options['Platform'], default="All")
 
-# Top-N selection
-top_n = st.sidebar.slider("Top N for Products & Cities", min_value=1, max_value=20, value=5, step=1)
+    # State filter
+    selected_state = st.multiselect("State", options['State'], default="All")
 
-# -------------------- Filter Data --------------------
-filtered_data = data.copy()
-filtered_data = filtered_data[
-    (filtered_data['Date'] >= pd.to_datetime(date_range[0])) &
-    (filtered_data['Date'] <= pd.to_datetime(date_range[1]))
-]
+    # City filter
+    selected_city = st.multiselect("City", options['City'], default="All")
 
-if "All" not in selected_platform:
-    filtered_data = filtered_data[filtered_data['Platform'].isin(selected_platform)]
+    # Product filter
+    selected_product = st.multiselect("Product", options['Product'], default="All")
 
-if "All" not in selected_state:
-    filtered_data = filtered_data[filtered_data['State'].isin(selected_state)]
+    # Top-N selection
+    top_n = st.slider("Top N for Products & Cities", min_value=1, max_value=20, value=5, step=1)
 
-if "All" not in selected_city:
-    filtered_data = filtered_data[filtered_data['City'].isin(selected_city)]
+    st.form_submit_button("Apply")
 
-if "All" not in selected_product:
-    filtered_data = filtered_data[filtered_data['Product'].isin(selected_product)]
+# -------------------- Filter Data --------------------
+selections = {'Platform': selected_platform, 'State': selected_state,
+              'City': selected_city, 'Product': selected_product}
+lo, hi, mask = filter_rows(data, cube, date_range[0], date_range[1], selections)
+filtered_data = data.iloc[lo:hi].iloc[mask]
+filter_key = selection_key(date_range[0], date_range[1], selections)
 
 # -------------------- Empty Data Check --------------------
 if filtered_data.empty:
@@ -75,11 +72,11 @@ else:
 
     # -------------------- KPIs --------------------
     total_revenue = filtered_data['Revenue'].sum()
-    total_orders = filtered_data['Order_ID'].nunique()
+    total_orders = nunique_codes(filtered_data['Order_ID'])
     aov = total_revenue / total_orders if total_orders else 0
     total_profit = filtered_data['Profit'].sum()
     total_quantity = filtered_data['Quantity'].sum()
-    unique_customers = filtered_data['Customer_ID'].nunique()
+    unique_customers = nunique_codes(filtered_data['Customer_ID'])
 
     # KPIs Row 1
     kpi1, kpi2, kpi3 = st.columns(3)
@@ -93,91 +90,59 @@ else:
     kpi5.metric("Unique Customers", unique_customers)
 
     # -------------------- Charts --------------------
-    # Revenue by Platform
-    rev_platform = filtered_data.groupby("Platform")['Revenue'].sum().reset_index()
-    fig_rev_platform = px.bar(
-        rev_platform, x='Platform', y='Revenue', text='Revenue',
-        title='Revenue by Platform'
-    )
-    fig_rev_platform.update_traces(texttemplate='₹%{text:,.2f}', textposition='outside')
-    fig_rev_platform.update_layout(showlegend=False)
+    @st.cache_resource(max_entries=32)
+    def build_figures(filter_key, _df):
+        templates = chart_templates()
+        by_sku, by_platform = platform_sums(_df)
 
-    # Profit by Platform (light orange)
-    profit_platform = filtered_data.groupby("Platform")['Profit'].sum().reset_index()
-    fig_profit_platform = px.bar(
-        profit_platform, x='Platform', y='Profit', text='Profit',
-        title='Profit by Platform', color_discrete_sequence=['#FFD580']
-    )
-    fig_profit_platform.update_traces(texttemplate='₹%{text:,.2f}', textposition='outside')
-    fig_profit_platform.update_layout(showlegend=False)
+        # Revenue by Platform
+        fig_rev_platform = refill(templates['rev_platform'], x=by_platform['Platform'].to_numpy(), y=by_platform['Revenue'].to_numpy(), text=by_platform['Revenue'].to_numpy())
 
-    # Top N Products by Revenue (light yellow)
-    top_products = (filtered_data.groupby('Product')['Revenue']
-                    .sum()
-                    .sort_values(ascending=False)
-                    .head(top_n)
-                    .reset_index())
-    fig_top_products = px.bar(
-        top_products, x='Revenue', y='Product', orientation='h',
-        title=f'Top {top_n} Products by Revenue', text='Revenue',
-        color_discrete_sequence=['#FFFACD']
-    )
-    fig_top_products.update_traces(texttemplate='₹%{text:,.2f}', textposition='inside')
-
-    # Top N Cities by Revenue (light green)
-    top_cities = (filtered_data.groupby('City')['Revenue']
-                  .sum()
-                  .sort_values(ascending=False)
-                  .head(top_n)
-                  .reset_index())
-    fig_top_cities = px.bar(
-        top_cities, x='Revenue', y='City', orientation='h',
-        title=f'Top {top_n} Cities by Revenue', text='Revenue',
-        color_discrete_sequence=['#90EE90']
-    )
-    fig_top_cities.update_traces(texttemplate='₹%{text:,.2f}', textposition='inside')
+        # Profit by Platform (light orange)
+        fig_profit_platform = refill(templates['profit_platform'], x=by_platform['Platform'].to_numpy(), y=by_platform['Profit'].to_numpy(), text=by_platform['Profit'].to_numpy())
 
-    # Revenue Trend Over Time
-    rev_trend = filtered_data.groupby('Date')['Revenue'].sum().reset_index()
-    fig_rev_trend = px.line(rev_trend, x='Date', y='Revenue', title='Revenue Trend Over Time')
-    fig_rev_trend.update_traces(mode='lines+markers', hovertemplate='Date: %{x}<br>Revenue: ₹%{y:,.2f}')
+        # Revenue Trend Over Time
+        rev_trend = revenue_trend(_df)
+        fig_rev_trend = refill(templates['rev_trend'], x=rev_trend['Date'].to_numpy(), y=rev_trend['Revenue'].to_numpy())
 
-    # Revenue vs Quantity Bubble Chart
-    bubble_data = filtered_data.groupby(['Platform', 'SKU']).agg({'Revenue':'sum', 'Quantity':'sum'}).reset_index()
-    fig_bubble = px.scatter(
-        bubble_data, x='Quantity', y='Revenue', size='Revenue', color='Platform',
-        hover_name='SKU', title='Revenue vs Quantity by Platform', size_max=60
-    )
-    fig_bubble.update_traces(hovertemplate='SKU: %{hovertext}<br>Revenue: ₹%{y:,.2f}<br>Quantity: %{x}')
+        # Revenue vs Quantity Bubble Chart
+        bubble_data = bubble_points(by_sku)
+        fig_bubble = px.scatter(
+            bubble_data, x='Quantity', y='Revenue', size='Revenue', color='Platform',
+            hover_name='SKU', title='Revenue vs Quantity by Platform', size_max=60,
+            render_mode='webgl'
+        )
+        fig_bubble.update_traces(hovertemplate='SKU: %{hovertext}<br>Revenue: ₹%{y:,.2f}<br>Quantity: %{x}')
+        return fig_rev_platform, fig_profit_platform, fig_rev_trend, fig_bubble
 
-    # -------------------- Layout: 3 rows x 2 columns --------------------
-    col1, col2 = st.columns(2)
-    col1.plotly_chart(fig_rev_platform, use_container_width=True)
-    col2.plotly_chart(fig_profit_platform, use_container_width=True)
+    fig_rev_platform, fig_profit_platform, fig_rev_trend, fig_bubble = build_figures(filter_key, filtered_data)
 
-    col3, col4 = st.columns(2)
-    col3.plotly_chart(fig_top_products, use_container_width=True)
-    col4.plotly_chart(fig_top_cities, use_container_width=True)
+    fig_top_products, fig_top_cities = build_top_figures(filter_key, top_n, filtered_data)
 
-    col5, col6 = st.columns(2)
-    col5.plotly_chart(fig_rev_trend, use_container_width=True)
-    col6.plotly_chart(fig_bubble, use_container_width=True)
+    # -------------------- Layout: 3 rows x 2 columns --------------------
+    chart_rows = [(fig_rev_platform, fig_profit_platform, STATIC_PLOT),
+                  (fig_top_products, fig_top_cities, STATIC_PLOT),
+                  (fig_rev_trend, fig_bubble, None)]
+    for left, right, config in chart_rows:
+        col_left, col_right = st.columns(2)
+        col_left.plotly_chart(left, use_container_width=True, config=config)
+        col_right.plotly_chart(right, use_container_width=True, config=config)
 
     # -------------------- Filtered Data Table --------------------
     st.markdown("### Filtered Data Preview")
     st.dataframe(filtered_data.head(30))
 
     # -------------------- Download Button --------------------
-    def convert_df_to_excel(df):
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
-        return output.getvalue()
-
-    excel_data = convert_df_to_excel(filtered_data)
+    # Parquet is the default download; each file is only built when its button is clicked
     st.download_button(
         label="Download Filtered Data",
-        data=excel_data,
+        data=lambda: convert_df_to_parquet(filtered_data),
+        file_name="filtered_fashion_data.parquet",
+        mime="application/vnd.apache.parquet"
+    )
+    st.download_button(
+        label="Download Filtered Data (Excel)",
+        data=lambda: convert_df_to_excel(filtered_data),
         file_name="filtered_fashion_data.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
@@ -0,0 +1,229 @@
+# dashboard_common.py
+# Data loading, filter index and chart/download helpers shared by the dashboard pages
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+import openpyxl
+import pyarrow.parquet as pq
+from io import BytesIO
+import os
+import threading
+
+CATEGORY_COLS = ['Platform', 'State', 'City', 'Product', 'SKU', 'Delivery_Status', 'Payment_Method',
+                 'Order_ID', 'Customer_ID']
+FILTER_COLS = ['Platform', 'State', 'City', 'Product']
+
+TREND_POINTS = 500
+STATIC_PLOT = {'staticPlot': True}  # plotly config for read-only charts: no pan/zoom/hover handlers
+BUBBLES_PER_PLATFORM = 50
+BUBBLES_MAX = 500  # overall cap, whatever the number of platforms
+
+# -------------------- Load Dataset --------------------
+# Shared read-only by every session (no per-session copy); never mutate data in place
+@st.cache_resource
+def load_data(file, columns=None):
+    if not os.path.exists(file):
+        st.error(f"Dataset not found at {file}. Please check the file path.")
+        return pd.DataFrame()
+    # Parquet sidecar next to the workbook, rebuilt whenever the xlsx or this module is newer.
+    # It is shared by every page and always keeps every column
+    cache = file + ".parquet"
+    if os.path.exists(cache) and os.path.getmtime(cache) >= max(os.path.getmtime(file), os.path.getmtime(__file__)):
+        # Only the requested column chunks are read
+        if columns is not None:
+            columns = [col for col in pq.read_schema(cache).names if col in columns]
+        return pd.read_parquet(cache, columns=columns)
+    df = pd.read_excel(file)
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    # Ensure numeric columns
+    df['Revenue'] = pd.to_numeric(df['Revenue'], errors='coerce')
+    df['Profit'] = pd.to_numeric(df['Profit'], errors='coerce')
+    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce', downcast='unsigned')
+    for col in CATEGORY_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    # Sorted by Date so the date filter can binary-search instead of scanning; the index
+    # keeps each row's position in the workbook
+    df = df.sort_values('Date', kind='stable')
+    # Written under a temp name and renamed into place, so another page never reads a
+    # half-written sidecar; a read-only app directory just serves the frame uncached
+    tmp = f"{cache}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        df.to_parquet(tmp, compression='zstd')
+        os.replace(tmp, cache)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return df if columns is None else df[[col for col in df.columns if col in columns]]
+
+# -------------------- Per-dataset Indexes --------------------
+# Keyed on file; _df is the frame load_data returned for it and is never hashed
+
+@st.cache_resource
+def build_cube(file, _df):
+    # Inverted index: cube[col] holds the row ids grouped by category code (ascending within
+    # each category) and the run offsets, so rows of code c are order[offsets[c]:offsets[c + 1]]
+    cube = {}
+    for col in FILTER_COLS:
+        if col in _df.columns:
+            codes = _df[col].cat.codes.values
+            order = np.argsort(codes, kind='stable')
+            # Nulls (code -1) sort first and fall outside every run
+            offsets = np.cumsum(np.bincount(codes + 1, minlength=len(_df[col].cat.categories) + 1))
+            cube[col] = (order, offsets)
+    return cube
+
+def select_rows(index, codes, lo, hi):
+    # Mask over the [lo, hi) window of the rows whose category is one of codes; only the
+    # selected categories' row ids inside the window are touched
+    order, offsets = index
+    mask = np.zeros(max(hi - lo, 0), dtype=bool)
+    for code in codes:
+        rows = order[offsets[code]:offsets[code + 1]]
+        mask[rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)] - lo] = True
+    return mask
+
+# -------------------- Filtering --------------------
+def filter_rows(data, cube, start, end, selections):
+    # data is sorted by Date: the range is two binary searches, then the cube rows of each
+    # selection ({column: chosen values}) are intersected over that window only.
+    # Returns the window [lo, hi) and the mask of the kept rows inside it
+    date_vals = data['Date'].values
+    lo = np.searchsorted(date_vals, np.datetime64(pd.to_datetime(start)), side='left')
+    hi = np.searchsorted(date_vals, np.datetime64(pd.to_datetime(end)), side='right')
+    mask = np.ones(max(hi - lo, 0), dtype=bool)
+    for col, selected in selections.items():
+        if "All" not in selected:
+            mask &= select_rows(cube[col], data[col].cat.categories.get_indexer(selected), lo, hi)
+    return lo, hi, mask
+
+def selection_key(start, end, selections):
+    # Cache key for everything derived from the filtered frame; the frame itself is never hashed
+    return (start, end) + tuple(tuple(selected) for selected in selections.values())
+
+@st.cache_resource
+def build_cancel_return(file, _df):
+    # Row flag of Cancelled/Returned orders, aligned with the rows of data
+    if 'Delivery_Status' not in _df.columns:
+        return np.zeros(len(_df), dtype=bool)
+    return _df['Delivery_Status'].isin(['Cancelled', 'Returned']).values
+
+@st.cache_resource
+def filter_options(file, _df):
+    # Sidebar choices of every filter column, "All" first; built once per dataset, not per rerun.
+    # The category list is already the distinct values, so no unique() pass over the rows
+    return {col: ["All"] + sorted(_df[col].cat.categories.tolist()) if col in _df.columns else ["All"] for col in FILTER_COLS}
+
+# -------------------- Aggregations --------------------
+def top_by_revenue(df, col, n):
+    # Revenue per category via bincount over the codes, then argpartition for the top n
+    codes = df[col].cat.codes.values
+    valid = codes >= 0
+    codes = codes[valid]
+    k = len(df[col].cat.categories)
+    sums = np.bincount(codes, weights=np.nan_to_num(df['Revenue'].values[valid]), minlength=k)
+    top = np.flatnonzero(np.bincount(codes, minlength=k))
+    if len(top) > n:
+        top = top[np.argpartition(-sums[top], n)[:n]]
+    top = top[np.argsort(-sums[top], kind='stable')]
+    return pd.DataFrame({col: df[col].cat.categories[top], 'Revenue': sums[top]})
+
+def nunique_codes(col):
+    # Distinct non-null values of a categorical column, counted over its integer codes
+    codes = col.cat.codes.values
+    return np.count_nonzero(np.bincount(codes[codes >= 0]))
+
+def platform_sums(df):
+    # One (Platform, SKU) groupby over the rows feeds the per-platform charts and the
+    # bubble chart; platform totals are re-summed from its few aggregated rows
+    by_sku = df.groupby(['Platform', 'SKU'], observed=True, sort=False)[['Revenue', 'Profit', 'Quantity']].sum()
+    by_platform = by_sku.groupby(level='Platform', observed=True).sum().reset_index()
+    return by_sku, by_platform
+
+def bubble_points(by_sku):
+    # Bubble chart rows: the BUBBLES_PER_PLATFORM highest-revenue SKUs of each platform and at
+    # most BUBBLES_MAX overall, in (Platform, SKU) order so the legend/colour order is stable
+    bubble_data = by_sku[['Revenue', 'Quantity']].sort_index().reset_index()
+    bubble_data = bubble_data[bubble_data.groupby('Platform', observed=True, sort=False)['Revenue']
+                              .rank(method='first', ascending=False) <= BUBBLES_PER_PLATFORM]
+    # nlargest reorders; sort_index restores the platform order
+    return bubble_data.nlargest(BUBBLES_MAX, 'Revenue').sort_index()
+
+# -------------------- Charts --------------------
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: row positions of the n_out points that keep the line's shape
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_end = edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[end:nxt_end].mean(), y[end:nxt_end].mean()
+        area = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (cy - y[a]))
+        a = start + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+def revenue_trend(df):
+    # Daily revenue, thinned to TREND_POINTS points
+    rev_trend = df.groupby('Date')['Revenue'].sum().reset_index()
+    return rev_trend.iloc[lttb(rev_trend['Date'].values.astype('int64').astype(float),
+                               rev_trend['Revenue'].values, TREND_POINTS)]
+
+def refill(template, **arrays):
+    # Copy of a cached single-trace template (styled once on empty frames by the pages'
+    # chart_templates) with its data arrays swapped in
+    fig = go.Figure(template)
+    fig.data[0].update(**arrays)
+    return fig
+
+@st.cache_resource
+def top_templates():
+    # Styled Top-N bars of the pages with a Top-N slider, built once on empty frames
+    fig_top_products = px.bar(pd.DataFrame(columns=['Revenue', 'Product']), x='Revenue', y='Product', orientation='h',
+                              title='Top N Products by Revenue', text='Revenue', color_discrete_sequence=['#FFFACD'])
+    fig_top_products.update_traces(texttemplate='₹%{text:,.2f}', textposition='inside')
+
+    fig_top_cities = px.bar(pd.DataFrame(columns=['Revenue', 'City']), x='Revenue', y='City', orientation='h',
+                            title='Top N Cities by Revenue', text='Revenue', color_discrete_sequence=['#90EE90'])
+    fig_top_cities.update_traces(texttemplate='₹%{text:,.2f}', textposition='inside')
+    return {'top_products': fig_top_products, 'top_cities': fig_top_cities}
+
+# Only the Top-N bars depend on top_n, so moving the slider rebuilds just these two
+@st.cache_resource(max_entries=32)
+def build_top_figures(filter_key, top_n, _df):
+    templates = top_templates()
+    # Top N Products by Revenue (light yellow)
+    top_products = top_by_revenue(_df, 'Product', top_n)
+    fig_top_products = refill(templates['top_products'], x=top_products['Revenue'].to_numpy(), y=top_products['Product'].to_numpy(), text=top_products['Revenue'].to_numpy())
+    fig_top_products.update_layout(title_text=f'Top {top_n} Products by Revenue')
+
+    # Top N Cities by Revenue (light green)
+    top_cities = top_by_revenue(_df, 'City', top_n)
+    fig_top_cities = refill(templates['top_cities'], x=top_cities['Revenue'].to_numpy(), y=top_cities['City'].to_numpy(), text=top_cities['Revenue'].to_numpy())
+    fig_top_cities.update_layout(title_text=f'Top {top_n} Cities by Revenue')
+    return fig_top_products, fig_top_cities
+
+# -------------------- Downloads --------------------
+# Not cached here, so a report's bytes are held at most once, by the caller's bounded cache
+def convert_df_to_excel(df):
+    # write_only streams rows instead of keeping a cell object per value
+    output = BytesIO()
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(df.columns))
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        ws.append(row)
+    wb.save(output)
+    return output.getvalue()
+
+def convert_df_to_parquet(df):
+    output = BytesIO()
+    df.to_parquet(output, index=False, compression='zstd')
+    return output.getvalue()
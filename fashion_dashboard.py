@@ -1,9 +1,12 @@
 # fashion_dashboard.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
-from io import BytesIO
 import os
+from dashboard_common import (STATIC_PLOT, build_cancel_return, build_cube, build_top_figures, bubble_points,
+                              convert_df_to_excel, convert_df_to_parquet, filter_options, filter_rows,
+                              load_data, nunique_codes, platform_sums, refill, revenue_trend, selection_key)
 
 # -------------------- Page Setup --------------------
 st.set_page_config(page_title="Fashion Sales Performance Dashboard", layout="wide")
@@ -14,58 +17,74 @@ st.markdown("This dashboard provides insights into fashion sales performance, in
 current_dir = os.path.dirname(os.path.abspath(__file__))
 data_file = os.path.join(current_dir, "fashion_dataset.xlsx")
 
-# -------------------- Load Dataset --------------------
-@st.cache_data
-def load_data(file):
-    if not os.path.exists(file):
-        st.error(f"Dataset not found at {file}. Please check the file path.")
-        return pd.DataFrame()
-    df = pd.read_excel(file)
-    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-    df['Revenue'] = pd.to_numeric(df['Revenue'], errors='coerce')
-    df['Profit'] = pd.to_numeric(df['Profit'], errors='coerce')
-    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-    return df
+def orders_per_customer(df):
+    # Distinct Order_IDs and total Revenue per Customer_ID, all over integer codes:
+    # np.unique on (customer, order) code pairs replaces a hashed groupby nunique
+    cust = df['Customer_ID'].cat.codes.values.astype(np.int64)
+    order = df['Order_ID'].cat.codes.values.astype(np.int64)
+    n_cust, n_order = len(df['Customer_ID'].cat.categories), len(df['Order_ID'].cat.categories)
+    valid = cust >= 0
+    pairs = np.unique(cust[valid & (order >= 0)] * n_order + order[valid & (order >= 0)])
+    orders = np.bincount(pairs // n_order, minlength=n_cust)
+    revenue = np.bincount(cust[valid], weights=np.nan_to_num(df['Revenue'].values[valid]), minlength=n_cust)
+    present = np.flatnonzero(np.bincount(cust[valid], minlength=n_cust))
+    return pd.DataFrame({'Customer_ID': pd.Categorical.from_codes(present, dtype=df['Customer_ID'].dtype),
+                         'Order_ID': orders[present], 'Revenue': revenue[present]})
+
+@st.cache_resource
+def chart_templates():
+    fig_rev_platform = px.bar(pd.DataFrame(columns=['Platform', 'Revenue']), x='Platform', y='Revenue', text='Revenue', title='Revenue by Platform')
+    fig_rev_platform.update_traces(texttemplate='₹%{text:,.2f}', textposition='outside')
+    fig_rev_platform.update_layout(bargap=0.4)  # narrower bars
+
+    fig_profit_platform = px.bar(pd.DataFrame(columns=['Platform', 'Profit']), x='Platform', y='Profit', text='Profit', title='Profit by Platform', color_discrete_sequence=['#FFD580'])
+    fig_profit_platform.update_traces(texttemplate='₹%{text:,.2f}', textposition='outside')
+    fig_profit_platform.update_layout(bargap=0.4)  # narrower bars
 
+    fig_rev_trend = px.line(pd.DataFrame(columns=['Date', 'Revenue']), x='Date', y='Revenue', title='Revenue Trend Over Time')
+    fig_rev_trend.update_traces(mode='lines+markers', hovertemplate='Date: %{x}<br>Revenue: ₹%{y:,.2f}')
+
+    fig_pie_qty = px.pie(pd.DataFrame(columns=['Platform', 'Quantity']), names='Platform', values='Quantity', title='Quantity Share by Platform')
+    fig_pie_qty.update_traces(textinfo='percent+label')
+    return {'rev_platform': fig_rev_platform, 'profit_platform': fig_profit_platform, 'rev_trend': fig_rev_trend, 'pie_qty': fig_pie_qty}
+
+# -------------------- Load Dataset --------------------
 data = load_data(data_file)
+cube = build_cube(data_file, data)
+is_cancel_return = build_cancel_return(data_file, data)
+options = filter_options(data_file, data)
 
 # -------------------- Sidebar Filters --------------------
 st.sidebar.markdown("### Filters")
-min_date = data['Date'].min() if not data.empty else pd.Timestamp.today()
-max_date = data['Date'].max() if not data.empty else pd.Timestamp.today()
-date_range = st.sidebar.date_input("Select Date Range", [min_date, max_date])
+with st.sidebar.form("filters"):
+    min_date = data['Date'].min() if not data.empty else pd.Timestamp.today()
+    max_date = data['Date'].max() if not data.empty else pd.Timestamp.today()
+    date_range = st.date_input("Select Date Range", [min_date, max_date])
+
+    selected_platform = st.multiselect("Platform", options['Platform'], default="All")
 
-platforms = ["All"] + sorted(data['Platform'].unique().tolist()) if not data.empty else ["All"]
-selected_platform = st.sidebar.multiselect("Platform", platforms, default="All")
+    selected_state = st.multiselect("State", options['State'], default="All")
 
-states = ["All"] + sorted(data['State'].unique().tolist()) if not data.empty else ["All"]
-selected_state = st.sidebar.multiselect("State", states, default="All")
+    selected_city = st.multiselect("City", options['City'], default="All")
 
-cities = ["All"] + sorted(data['City'].unique().tolist()) if not data.empty else ["All"]
-selected_city = st.sidebar.multiselect("City", cities, default="All")
+    selected_product = st.multiselect("Product", options['Product'], default="All")
 
-products = ["All"] + sorted(data['Product'].unique().tolist()) if not data.empty else ["All"]
-selected_product = st.sidebar.multiselect("Product", products, default="All")
+    top_n = st.slider("Top N for Products & Cities", min_value=1, max_value=20, value=5, step=1)
 
-top_n = st.sidebar.slider("Top N for Products & Cities", min_value=1, max_value=20, value=5, step=1)
+    st.form_submit_button("Apply")
 
 # -------------------- Filter Data --------------------
-filtered_data = data.copy()
 if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
     start_date, end_date = date_range[0], date_range[1]
 else:
     start_date = date_range
     end_date = date_range
 
-filtered_data = filtered_data[(filtered_data['Date'] >= pd.to_datetime(start_date)) & (filtered_data['Date'] <= pd.to_datetime(end_date))]
-if "All" not in selected_platform:
-    filtered_data = filtered_data[filtered_data['Platform'].isin(selected_platform)]
-if "All" not in selected_state:
-    filtered_data = filtered_data[filtered_data['State'].isin(selected_state)]
-if "All" not in selected_city:
-    filtered_data = filtered_data[filtered_data['City'].isin(selected_city)]
-if "All" not in selected_product:
-    filtered_data = filtered_data[filtered_data['Product'].isin(selected_product)]
+selections = {'Platform': selected_platform, 'State': selected_state,
+              'City': selected_city, 'Product': selected_product}
+lo, hi, mask = filter_rows(data, cube, start_date, end_date, selections)
+filtered_data = data.iloc[lo:hi].iloc[mask]
+filter_key = selection_key(start_date, end_date, selections)
 
 # -------------------- Empty Data Check --------------------
 if filtered_data.empty:
@@ -73,12 +92,12 @@ if filtered_data.empty:
 else:
     # -------------------- KPIs --------------------
     total_revenue = filtered_data['Revenue'].sum()
-    total_orders = filtered_data['Order_ID'].nunique()
+    total_orders = nunique_codes(filtered_data['Order_ID'])
     aov = total_revenue / total_orders if total_orders else 0
     total_profit = filtered_data['Profit'].sum()
     total_quantity = filtered_data['Quantity'].sum()
-    unique_customers = filtered_data['Customer_ID'].nunique()
-    cancel_return_orders = filtered_data['Delivery_Status'].isin(['Cancelled', 'Returned']).sum() if 'Delivery_Status' in filtered_data.columns else 0
+    unique_customers = nunique_codes(filtered_data['Customer_ID'])
+    cancel_return_orders = np.count_nonzero(is_cancel_return[lo:hi][mask])
 
     # KPIs Row 1
     kpi1, kpi2, kpi3 = st.columns(3)
@@ -93,82 +112,86 @@ else:
     kpi6.metric("Cancel/Return Orders", int(cancel_return_orders))
 
     # -------------------- Charts --------------------
-    rev_platform = filtered_data.groupby("Platform")['Revenue'].sum().reset_index()
-    fig_rev_platform = px.bar(rev_platform, x='Platform', y='Revenue', text='Revenue', title='Revenue by Platform')
-    fig_rev_platform.update_traces(texttemplate='₹%{text:,.2f}', textposition='outside')
-    fig_rev_platform.update_layout(bargap=0.4)  # narrower bars
+    @st.cache_resource(max_entries=32)
+    def build_figures(filter_key, _df):
+        templates = chart_templates()
+        by_sku, by_platform = platform_sums(_df)
 
-    profit_platform = filtered_data.groupby("Platform")['Profit'].sum().reset_index()
-    fig_profit_platform = px.bar(profit_platform, x='Platform', y='Profit', text='Profit', title='Profit by Platform', color_discrete_sequence=['#FFD580'])
-    fig_profit_platform.update_traces(texttemplate='₹%{text:,.2f}', textposition='outside')
-    fig_profit_platform.update_layout(bargap=0.4)  # narrower bars
+        fig_rev_platform = refill(templates['rev_platform'], x=by_platform['Platform'].to_numpy(), y=by_platform['Revenue'].to_numpy(), text=by_platform['Revenue'].to_numpy())
 
-    top_products = filtered_data.groupby('Product')['Revenue'].sum().sort_values(ascending=False).head(top_n).reset_index()
-    fig_top_products = px.bar(top_products, x='Revenue', y='Product', orientation='h', title=f'Top {top_n} Products by Revenue', text='Revenue', color_discrete_sequence=['#FFFACD'])
-    fig_top_products.update_traces(texttemplate='₹%{text:,.2f}', textposition='inside')
+        fig_profit_platform = refill(templates['profit_platform'], x=by_platform['Platform'].to_numpy(), y=by_platform['Profit'].to_numpy(), text=by_platform['Profit'].to_numpy())
 
-    top_cities = filtered_data.groupby('City')['Revenue'].sum().sort_values(ascending=False).head(top_n).reset_index()
-    fig_top_cities = px.bar(top_cities, x='Revenue', y='City', orientation='h', title=f'Top {top_n} Cities by Revenue', text='Revenue', color_discrete_sequence=['#90EE90'])
-    fig_top_cities.update_traces(texttemplate='₹%{text:,.2f}', textposition='inside')
+        rev_trend = revenue_trend(_df)
+        fig_rev_trend = refill(templates['rev_trend'], x=rev_trend['Date'].to_numpy(), y=rev_trend['Revenue'].to_numpy())
 
-    rev_trend = filtered_data.groupby('Date')['Revenue'].sum().reset_index()
-    fig_rev_trend = px.line(rev_trend, x='Date', y='Revenue', title='Revenue Trend Over Time')
-    fig_rev_trend.update_traces(mode='lines+markers', hovertemplate='Date: %{x}<br>Revenue: ₹%{y:,.2f}')
+        bubble_data = bubble_points(by_sku)
+        fig_bubble = px.scatter(bubble_data, x='Quantity', y='Revenue', size='Revenue', color='Platform', hover_name='SKU', title='Revenue vs Quantity by Platform', size_max=60, render_mode='webgl')
+        fig_bubble.update_traces(hovertemplate='SKU: %{hovertext}<br>Revenue: ₹%{y:,.2f}<br>Quantity: %{x}')
 
-    bubble_data = filtered_data.groupby(['Platform', 'SKU']).agg({'Revenue':'sum', 'Quantity':'sum'}).reset_index()
-    fig_bubble = px.scatter(bubble_data, x='Quantity', y='Revenue', size='Revenue', color='Platform', hover_name='SKU', title='Revenue vs Quantity by Platform', size_max=60)
-    fig_bubble.update_traces(hovertemplate='SKU: %{hovertext}<br>Revenue: ₹%{y:,.2f}<br>Quantity: %{x}')
+        fig_pie_qty = refill(templates['pie_qty'], labels=by_platform['Platform'].to_numpy(), values=by_platform['Quantity'].to_numpy())
+        return fig_rev_platform, fig_profit_platform, fig_rev_trend, fig_bubble, fig_pie_qty
 
-    # -------------------- Layout Charts --------------------
-    col1, col2 = st.columns([0.9, 0.9])
-    col1.plotly_chart(fig_rev_platform, use_container_width=True)
-    col2.plotly_chart(fig_profit_platform, use_container_width=True)
+    fig_rev_platform, fig_profit_platform, fig_rev_trend, fig_bubble, fig_pie_qty = build_figures(filter_key, filtered_data)
 
-    col3, col4 = st.columns([0.9, 0.9])
-    col3.plotly_chart(fig_top_products, use_container_width=True)
-    col4.plotly_chart(fig_top_cities, use_container_width=True)
+    fig_top_products, fig_top_cities = build_top_figures(filter_key, top_n, filtered_data)
 
-    col5, col6 = st.columns([0.9, 0.9])
-    col5.plotly_chart(fig_rev_trend, use_container_width=True)
-    col6.plotly_chart(fig_bubble, use_container_width=True)
+    # -------------------- Layout Charts --------------------
+    chart_rows = [(fig_rev_platform, fig_profit_platform, STATIC_PLOT),
+                  (fig_top_products, fig_top_cities, STATIC_PLOT),
+                  (fig_rev_trend, fig_bubble, None)]
+    for left, right, config in chart_rows:
+        col_left, col_right = st.columns([0.9, 0.9])
+        col_left.plotly_chart(left, use_container_width=True, config=config)
+        col_right.plotly_chart(right, use_container_width=True, config=config)
 
     # -------------------- Additional Visuals --------------------
-    pie_qty = filtered_data.groupby('Platform')['Quantity'].sum().reset_index()
-    fig_pie_qty = px.pie(pie_qty, names='Platform', values='Quantity', title='Quantity Share by Platform')
-    fig_pie_qty.update_traces(textinfo='percent+label')
+    # Per-state sums are cached per filter_key; the slider only re-runs the nlargest selection
+    @st.cache_data(max_entries=32)
+    def state_totals(filter_key, _df):
+        return _df.groupby('State', observed=True, sort=False)['Revenue'].sum().reset_index().rename(columns={'Revenue': 'Total GMV'})
 
-    state_gmv = filtered_data.groupby('State')['Revenue'].sum().reset_index().rename(columns={'Revenue': 'Total GMV'})
-    state_gmv = state_gmv.sort_values(by='Total GMV', ascending=False).reset_index(drop=True)
+    state_gmv = state_totals(filter_key, filtered_data).nlargest(top_n, 'Total GMV').reset_index(drop=True)
 
     col7, col8 = st.columns([0.8, 1.2])
-    col7.plotly_chart(fig_pie_qty, use_container_width=True)
+    col7.plotly_chart(fig_pie_qty, use_container_width=True, config=STATIC_PLOT)
     with col8:
         st.markdown("### State — Total GMV")
-        st.table(state_gmv.head(top_n))
-
-    # -------------------- Download Buttons (2x2) --------------------
-    def convert_df_to_excel(df):
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
-        return output.getvalue()
-
-    # Prepare datasets
-    excel_full = convert_df_to_excel(data)
-    if 'Payment_Method' in filtered_data.columns:
-        df_payment = filtered_data.groupby(['Customer_ID','Payment_Method']).sum(numeric_only=True).reset_index()
-        excel_payment = convert_df_to_excel(df_payment)
-    df_loyal = filtered_data.groupby('Customer_ID').agg({'Order_ID':'nunique','Revenue':'sum'}).reset_index()
-    df_loyal = df_loyal[df_loyal['Order_ID']>1]
-    excel_loyal = convert_df_to_excel(df_loyal)
-    df_one_timer = filtered_data.groupby('Customer_ID').agg({'Order_ID':'nunique','Revenue':'sum'}).reset_index()
-    df_one_timer = df_one_timer[df_one_timer['Order_ID']==1]
-    excel_one_timer = convert_df_to_excel(df_one_timer)
-
-    # Display buttons in 2 rows x 2 cols
+        st.table(state_gmv)
+
+    # -------------------- Download Buttons --------------------
+    # data never changes for a given file, so its workbook is built once per process,
+    # back in the workbook's row order (data itself is sorted by Date)
+    @st.cache_resource(max_entries=1)
+    def build_full_dataset(file):
+        return convert_df_to_excel(load_data(file).sort_index())
+
+    # Report frames are cached per filter_key; the filtered frame itself is not hashed
+    @st.cache_data(max_entries=32)
+    def build_payment(filter_key, _df):
+        df_payment = _df.groupby(['Customer_ID','Payment_Method'], observed=True).sum(numeric_only=True).reset_index()
+        return convert_df_to_excel(df_payment)
+
+    # Loyal and one-timer reports split the same per-customer aggregate
+    @st.cache_data(max_entries=32)
+    def customer_orders(filter_key, _df):
+        return orders_per_customer(_df)
+
+    def loyal_customers():
+        by_customer = customer_orders(filter_key, filtered_data)
+        return by_customer[by_customer['Order_ID']>1]
+
+    def one_timer_customers():
+        by_customer = customer_orders(filter_key, filtered_data)
+        return by_customer[by_customer['Order_ID']==1]
+
+    # Every file is generated only when its button is clicked
     b1, b2 = st.columns(2)
-    b1.download_button("Download Full Dataset", data=excel_full, file_name="full_dataset.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    b2.download_button("Download Payment Method per Customer", data=excel_payment, file_name="payment_method_customers.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    b1.download_button("Download Full Dataset", data=lambda: build_full_dataset(data_file), file_name="full_dataset.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    if 'Payment_Method' in filtered_data.columns:
+        b2.download_button("Download Payment Method per Customer", data=lambda: build_payment(filter_key, filtered_data), file_name="payment_method_customers.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
     b3, b4 = st.columns(2)
-    b3.download_button("Download Loyal Customers", data=excel_loyal, file_name="loyal_customers.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    b4.download_button("Download One-Timer Customers", data=excel_one_timer, file_name="one_timer_customers.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    b3.download_button("Download Loyal Customers", data=lambda: convert_df_to_excel(loyal_customers()), file_name="loyal_customers.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    b4.download_button("Download One-Timer Customers", data=lambda: convert_df_to_excel(one_timer_customers()), file_name="one_timer_customers.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    b5, b6 = st.columns(2)
+    b5.download_button("Download Loyal Customers (Parquet)", data=lambda: convert_df_to_parquet(loyal_customers()), file_name="loyal_customers.parquet", mime="application/vnd.apache.parquet")
+    b6.download_button("Download One-Timer Customers (Parquet)", data=lambda: convert_df_to_parquet(one_timer_customers()), file_name="one_timer_customers.parquet", mime="application/vnd.apache.parquet")